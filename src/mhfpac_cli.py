@@ -1,10 +1,6 @@
 # mhfpac_cli.py
 from __future__ import annotations
 import sys
-from pathlib import Path
-
-from pac_parser import main as export_main      # expects [input.bin, output.csv]
-from mhfpac_import import main as import_main   # expects [--flags..., input.bin, edits.csv, output.bin]
 
 VERSION = "mhfpac tools 1.0"
 
@@ -83,21 +79,6 @@ def extract_opt(argv: list[str], name: str, takes_value: bool = True):
     return val, out
 
 
-def normalize_argv(argv: list[str]) -> list[str]:
-    """
-    Make CLI forgiving:
-      - If 'export' or 'import' appears anywhere, move it to front.
-      - If no command, infer:
-          export: <bin> <csv>
-          import: <bin> <csv> <bin>
-    """
-    if not argv:
-        return argv
-
-    # pull out known global flags before detecting command
-    return argv
-
-
 def main(raw_argv: list[str]) -> int:
     if not raw_argv or any(a in ("-h", "--help", "/?") for a in raw_argv):
         return print_help()
@@ -108,14 +89,11 @@ def main(raw_argv: list[str]) -> int:
 
     # Detect explicit command anywhere
     cmd = None
-    if "export" in argv:
-        i = argv.index("export")
-        cmd = "export"
-        argv = argv[:i] + argv[i+1:]
-    elif "import" in argv:
-        i = argv.index("import")
-        cmd = "import"
-        argv = argv[:i] + argv[i+1:]
+    for i, tok in enumerate(argv):
+        if tok in ("export", "import"):
+            cmd = tok
+            del argv[i]  # argv is already a fresh list from extract_opt
+            break
 
     # Infer command if not given
     if cmd is None:
@@ -134,6 +112,8 @@ def main(raw_argv: list[str]) -> int:
         if len(argv) != 2 or not looks_bin(argv[0]) or not looks_csv(argv[1]):
             print("Error: export requires: <input.bin> <output.csv>\n", file=sys.stderr)
             return print_help() or 2
+        # Subcommand modules are imported on demand so --help/--version stay cheap
+        from pac_parser import main as export_main      # expects [input.bin, output.csv]
         return export_main([argv[0], argv[1]])
 
     if cmd == "import":
@@ -141,11 +121,21 @@ def main(raw_argv: list[str]) -> int:
         if len(argv) != 3 or not (looks_bin(argv[0]) and looks_csv(argv[1]) and looks_bin(argv[2])):
             print("Error: import requires: <input.bin> <edits.csv> <output.bin>\n", file=sys.stderr)
             return print_help() or 2
-        fwd = []
-        if encoding:
-            fwd += ["--encoding", encoding]
-        fwd += [argv[0], argv[1], argv[2]]
-        return import_main(fwd)
+        from pathlib import Path
+        from mhfpac_import import patch, parse_tables_arg
+        try:
+            return patch(
+                bin_in=Path(argv[0]),
+                csv_in=Path(argv[1]),
+                bin_out=Path(argv[2]),
+                encoding=encoding or "cp932",
+                tables=parse_tables_arg(None),
+                backup=True,
+                validate=False,
+            )
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
 
     # Fallback
     return print_help() or 2
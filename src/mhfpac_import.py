@@ -41,8 +41,14 @@ Notes
 from __future__ import annotations
 import sys
 import csv
+import mmap
+import shutil
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Tuple, Union
 
 EXPECTED_HDR1 = 0x1A636170
 EXPECTED_HDR2 = 0x0000000A
@@ -55,41 +61,40 @@ TABLES = {
     "skillDesc":   (0x00B8, 0x00C0),
 }
 
+# Anything the readers below accept: the mapped input file or plain bytes
+Buffer = Union[bytes, bytearray, mmap.mmap]
 
-def ru32(buf: bytes, off: int) -> int:
+# (targets, slots): parallel u32 arrays sorted by target offset
+PointerIndex = Tuple[array, array]
+
+_U32 = struct.Struct("<I")
+
+
+def ru32(buf: Buffer, off: int) -> int:
     if off < 0 or off + 4 > len(buf):
         raise ValueError(f"u32 read OOB at 0x{off:X}")
-    return int.from_bytes(buf[off:off+4], "little")
+    return _U32.unpack_from(buf, off)[0]
 
 
-def wu32(buf: bytearray, off: int, val: int) -> None:
-    if off < 0 or off + 4 > len(buf):
-        raise ValueError(f"u32 write OOB at 0x{off:X}")
-    buf[off:off+4] = val.to_bytes(4, "little")
+def cstr_end(buf: Buffer, off: int) -> int:
+    """Offset of the 0x00 terminator of the string at off (len(buf) if none)."""
+    end = buf.find(b"\x00", off)
+    return len(buf) if end == -1 else end
 
 
-def read_cstr(buf: bytes, off: int, enc: str) -> str:
-    n = len(buf)
-    i = off
-    while i < n and buf[i] != 0:
-        i += 1
-    raw = buf[off:i]
-    for codec in (enc, "latin-1", "utf-8"):
-        try:
-            return raw.decode(codec) if codec != "utf-8" else raw.decode(codec, errors="replace")
-        except Exception:
-            continue
-    return ""
+def read_cstr(buf: Buffer, off: int, enc: str) -> str:
+    return buf[off:cstr_end(buf, off)].decode(enc, errors="replace")
 
 
-def write_cstr_append(buf: bytearray, text: str, enc: str) -> int:
-    off = len(buf)
-    data = text.encode(enc, errors="replace") + b"\x00"
-    buf.extend(data)
-    return off
+def legacy_decode(raw: bytes, enc: str) -> str:
+    """Text older exporters wrote for raw: strict enc, else latin-1."""
+    try:
+        return raw.decode(enc)
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
 
 
-def validate_header(buf: bytes) -> None:
+def validate_header(buf: Buffer) -> None:
     h1 = ru32(buf, 0x00)
     h2 = ru32(buf, 0x04)
     if h1 != EXPECTED_HDR1 or h2 != EXPECTED_HDR2:
@@ -97,20 +102,37 @@ def validate_header(buf: bytes) -> None:
                          f"(expected 0x{EXPECTED_HDR1:08X} 0x{EXPECTED_HDR2:08X})")
 
 
-def build_pointer_index(buf: bytes, which: List[str]) -> Dict[int, List[int]]:
+def merge_ranges(ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sort [start, end) ranges and merge any that overlap."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def build_pointer_index(buf: Buffer, which: List[str]) -> PointerIndex:
     """
-    Map: target_offset -> [pointer_slot_offsets...]
-    where pointer_slot_offsets are file offsets of 4-byte pointer values.
+    Sorted (targets, slots) arrays: slots[i] is the file offset of a 4-byte
+    pointer value whose target offset is targets[i].
     """
-    idx: Dict[int, List[int]] = {}
-    for name in which:
-        start, end = TABLES[name]
-        for slot in range(start, end, 4):
-            if slot + 4 > len(buf):
-                break
-            val = ru32(buf, slot)
-            idx.setdefault(val, []).append(slot)
-    return idx
+    pairs: List[Tuple[int, int]] = []
+    # skills lies inside skillActive; scan each slot once even if both are selected
+    for start, end in merge_ranges(TABLES[name] for name in which):
+        # Clip to whole slots present in the file, then decode the table in one call
+        end = min(end, start + max(0, len(buf) - start) // 4 * 4)
+        vals = _U32.iter_unpack(buf[start:end])
+        pairs.extend((val, slot) for slot, (val,) in zip(range(start, end, 4), vals))
+    pairs.sort()
+    return array("I", (t for t, _ in pairs)), array("I", (s for _, s in pairs))
+
+
+def lookup_slots(index: PointerIndex, target: int) -> array:
+    """Pointer slot offsets that currently point at target."""
+    targets, slots = index
+    return slots[bisect_left(targets, target):bisect_right(targets, target)]
 
 
 def parse_tables_arg(arg: str | None) -> List[str]:
@@ -129,82 +151,103 @@ def parse_tables_arg(arg: str | None) -> List[str]:
 
 def read_export_csv(csv_path: Path) -> List[Tuple[int, str]]:
     """
-    Accepts exporter CSV (index,offset,text). Returns list of (offset, new_text).
-    Offset accepts '0x..' hex or decimal.
+    Reads exporter CSV (index,offset,text); the header row is skipped.
+    Returns list of (offset, new_text). Offset accepts '0x..' hex or decimal.
     """
-    out: List[Tuple[int, str]] = []
     with csv_path.open("r", encoding="utf-8") as f:
         r = csv.reader(f)
-        header = next(r, None)
-        # If header detected (index, offset, text)
-        if header and len(header) >= 2 and header[0].lower().strip() == "index":
-            for row in r:
-                if not row or len(row) < 3:
-                    continue
-                off_s = row[1].strip()
-                txt = row[2]
-                off = int(off_s, 16) if off_s.lower().startswith("0x") else int(off_s)
-                out.append((off, txt))
-        else:
-            # No header → assume (index,offset,text) anyway
-            if header and len(header) >= 2:
-                off_s = header[1].strip()
-                txt = header[2] if len(header) > 2 else ""
-                try:
-                    off = int(off_s, 16) if off_s.lower().startswith("0x") else int(off_s)
-                    out.append((off, txt))
-                except Exception:
-                    pass
-            for row in r:
-                if not row or len(row) < 2:
-                    continue
-                off_s = row[1].strip()
-                txt = row[2] if len(row) > 2 else ""
-                try:
-                    off = int(off_s, 16) if off_s.lower().startswith("0x") else int(off_s)
-                except Exception:
-                    continue
-                out.append((off, txt))
-    return out
+        next(r, None)
+        # int(s, 0) takes the exporter's 0x prefix (or plain decimal) directly
+        return [(int(row[1], 0), row[2]) for row in r if len(row) >= 3 and row[1]]
 
 
 def patch(bin_in: Path, csv_in: Path, bin_out: Path, encoding: str, tables: List[str], backup: bool, validate: bool) -> int:
-    data = bytearray(bin_in.read_bytes())
-    if validate:
-        validate_header(data)
-
-    # Build pointer index BEFORE any modifications (original target offsets)
-    ptr_index = build_pointer_index(bytes(data), tables)
-
-    edits = read_export_csv(csv_in)
-
-    changed_strings = 0
-    updated_slots = 0
+    # The original file is only ever read, so map it instead of copying it;
+    # new strings are collected and written after the original EOF.
+    with bin_in.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        base_len = len(data)
+        # Check once that every selected table lies inside the file rather than
+        # silently patching a truncated PAC with part of its pointers missing.
+        need = max((TABLES[name][1] for name in tables), default=0)
+        if base_len < need:
+            raise ValueError(f"File too small for the selected pointer tables: "
+                             f"0x{base_len:X} bytes, need at least 0x{need:X}")
+        if validate:
+            validate_header(data)
+
+        # Build pointer index BEFORE any modifications (original target offsets)
+        ptr_index = build_pointer_index(data, tables)
+
+        edits = read_export_csv(csv_in)
+
+        appended: List[bytes] = []
+        tail_len = 0
+        repoint: Dict[int, int] = {}  # pointer slot -> new target offset
+
+        changed_strings = 0
+        updated_slots = 0
+
+        for off, new_text in edits:
+            if not 0 <= off < base_len:
+                continue
+            # Compare encoded bytes so unchanged rows never need a decode (and
+            # a length mismatch needs no slice either); only fall back to
+            # comparing text for strings that do not round-trip.
+            encoded = new_text.encode(encoding, errors="replace")
+            end = cstr_end(data, off)
+            if end - off == len(encoded) and data[off:end] == encoded:
+                continue  # unchanged
+            if read_cstr(data, off, encoding) == new_text:
+                continue  # unchanged
+            if legacy_decode(data[off:end], encoding) == new_text:
+                continue  # unchanged, from a CSV written by an older exporter
+            # which pointer slots currently point at this original offset?
+            slots = lookup_slots(ptr_index, off)
+            if not slots:
+                # No pointers currently referencing this string; skip
+                continue
+            # Append new string and repoint all slots
+            blob = encoded + b"\x00"
+            new_off = base_len + tail_len
+            appended.append(blob)
+            tail_len += len(blob)
+            for slot in slots:
+                repoint[slot] = new_off
+                updated_slots += 1
+            changed_strings += 1
+
+        if backup:
+            bak = bin_in.with_suffix(bin_in.suffix + ".bak")
+            if not bak.exists():
+                shutil.copyfile(bin_in, bak)
+
+        # Write next to the destination and swap it in afterwards: bin_out may
+        # be bin_in itself, which must not be truncated while it is mapped.
+        # A unique name means a run killed mid-write never blocks later imports.
+        fd, tmp_name = tempfile.mkstemp(dir=bin_out.parent, prefix=bin_out.name + ".", suffix=".tmp")
+        tmp = Path(tmp_name)
+        try:
+            # Stream the original through in slot order, splicing in the new
+            # pointer values, then the appended strings.
+            with open(fd, "wb", buffering=1 << 20) as out, memoryview(data) as view:
+                pos = 0
+                for slot, new_off in sorted(repoint.items()):
+                    out.write(view[pos:slot])
+                    out.write(_U32.pack(new_off))
+                    pos = slot + 4
+                out.write(view[pos:])
+                out.writelines(appended)
+            # mkstemp creates the file owner-only; give the output the input's mode
+            shutil.copymode(bin_in, tmp)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+    try:
+        tmp.replace(bin_out)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
 
-    for off, new_text in edits:
-        if off < 0 or off >= len(data):
-            continue
-        current_text = read_cstr(bytes(data), off, encoding)
-        if new_text == current_text:
-            continue  # unchanged
-        # which pointer slots currently point at this original offset?
-        slots = ptr_index.get(off, [])
-        if not slots:
-            # No pointers currently referencing this string; skip
-            continue
-        # Append new string and repoint all slots
-        new_off = write_cstr_append(data, new_text, encoding)
-        for slot in slots:
-            wu32(data, slot, new_off)
-            updated_slots += 1
-        changed_strings += 1
-
-    if backup:
-        bak = bin_in.with_suffix(bin_in.suffix + ".bak")
-        if not bak.exists():
-            bak.write_bytes(bin_in.read_bytes())
-
-    bin_out.write_bytes(bytes(data))
     print(f"[OK] Patched: {bin_out}")
     print(f"    Strings changed: {changed_strings}")
     print(f"    Pointer slots updated: {updated_slots}")
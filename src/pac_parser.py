@@ -5,7 +5,7 @@ mhfpac_export.py
 Export null-terminated strings from an mhfpac-style BIN/PAC.
 
 - Reads a 32-bit LE pointer at 0x10C to find the start of the string blob
-- Decodes text as Shift-JIS (cp932) with safe fallbacks
+- Decodes text as Shift-JIS (cp932); undecodable bytes become U+FFFD
 - Writes CSV: index, offset, text
 
 Usage:
@@ -14,69 +14,87 @@ Usage:
 
 from __future__ import annotations
 import sys
+import mmap
+import struct
 from pathlib import Path
 import csv
+from typing import Iterator
 
 
 POINTER_OFFSET = 0x10C  # file offset containing the uint32 LE pointer to the string blob
 
+DECODE_CHUNK = 1 << 20  # bytes of string blob decoded per codec call
 
-def ru32(buf: bytes, off: int) -> int:
+_U32 = struct.Struct("<I")
+
+
+def ru32(buf: bytes | mmap.mmap, off: int) -> int:
     """Read little-endian uint32 at off."""
     if off < 0 or off + 4 > len(buf):
         raise ValueError(f"u32 read out of bounds at 0x{off:X}")
-    return int.from_bytes(buf[off:off + 4], "little")
-
-
-def decode_bytes(bs: bytes, enc: str = "cp932") -> str:
-    """Decode with Shift-JIS first, then safe fallbacks."""
-    try:
-        return bs.decode(enc)
-    except Exception:
-        try:
-            return bs.decode("latin-1")
-        except Exception:
-            return bs.decode("utf-8", errors="replace")
+    return _U32.unpack_from(buf, off)[0]
 
 
-def read_cstr(buf: bytes, off: int, enc: str = "cp932") -> tuple[str, int]:
+def read_cstr(buf: bytes | mmap.mmap, off: int, enc: str = "cp932") -> tuple[str, int]:
     """
     Read a null-terminated string starting at off.
     Returns (text, next_offset_after_terminator).
     """
-    n = len(buf)
-    i = off
-    while i < n and buf[i] != 0:
-        i += 1
-    text = decode_bytes(buf[off:i], enc)
+    end = buf.find(b"\x00", off)
+    if end == -1:
+        end = len(buf)
+    text = buf[off:end].decode(enc, errors="replace")
     # advance past the 0x00 terminator
-    i = min(i + 1, n)
-    return text, i
+    return text, min(end + 1, len(buf))
 
 
-def export_strings(bin_path: Path, csv_path: Path) -> int:
-    data = bin_path.read_bytes()
-    start = ru32(data, POINTER_OFFSET)
-
-    rows: list[tuple[int, str, str]] = []
-    idx = 0
+def iter_cstrs(buf: bytes | mmap.mmap, start: int, enc: str = "cp932") -> Iterator[tuple[int, str]]:
+    """
+    Yield (offset, text) for each null-terminated string from start to EOF.
+    enc must be ASCII-compatible (cp932, latin-1, utf-8, ...): the blob is
+    decoded in chunks split on NUL, which is wrong for codecs such as
+    UTF-16 where 0x00 bytes occur inside characters.
+    """
+    n = len(buf)
     i = start
-    n = len(data)
-
     while i < n:
-        text, nxt = read_cstr(data, i)
-        rows.append((idx, f"0x{i:08X}", text))
-        idx += 1
-        if nxt <= i:  # safety
-            break
-        i = nxt
-
-    with csv_path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["index", "offset", "text"])
-        w.writerows(rows)
-
-    print(f"Exported {len(rows)} strings to {csv_path}")
+        # Decode about DECODE_CHUNK bytes per codec call, cut just after a
+        # terminator so no string spans two chunks. 0x00 is never part of a
+        # multibyte sequence, so splitting the decoded text on NUL matches
+        # decoding string by string, without a decode call per string.
+        cut = buf.find(b"\x00", min(i + DECODE_CHUNK, n) - 1)
+        end = n if cut == -1 else cut + 1
+        with memoryview(buf) as view, view[i:end] as chunk:
+            texts = str(chunk, enc, "replace").split("\x00")
+        if cut != -1:
+            texts.pop()  # empty remainder after the chunk's final terminator
+        for text in texts:
+            yield i, text
+            nul = buf.find(b"\x00", i, end)
+            i = end if nul == -1 else nul + 1
+
+
+def export_strings(bin_path: Path, csv_path: Path) -> int:
+    # Map the file read-only instead of copying it into memory; pages are
+    # faulted in on demand as the scan walks the string blob.
+    with bin_path.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = ru32(data, POINTER_OFFSET)
+
+        count = 0
+
+        def rows() -> Iterator[tuple[int, str, str]]:
+            nonlocal count
+            for idx, (off, text) in enumerate(iter_cstrs(data, start)):
+                count = idx + 1
+                yield idx, f"0x{off:08X}", text
+
+        # Rows are streamed straight from the scan into the writer
+        with csv_path.open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["index", "offset", "text"])
+            w.writerows(rows())
+
+    print(f"Exported {count} strings to {csv_path}")
     return 0
 
 
@@ -0,0 +1,158 @@
+import csv
+import io
+import struct
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import mhfpac_import  # noqa: E402
+import pac_parser  # noqa: E402
+
+BLOB_START = 0x1000
+
+
+def make_pac(path: Path, strings: list[bytes], slots: dict[int, int]) -> list[int]:
+    """
+    Write a minimal PAC with strings in the blob at BLOB_START and
+    slots mapping pointer slot offset -> index into strings.
+    Returns the file offset of each string.
+    """
+    data = bytearray(BLOB_START)
+    struct.pack_into("<II", data, 0x00, mhfpac_import.EXPECTED_HDR1, mhfpac_import.EXPECTED_HDR2)
+    struct.pack_into("<I", data, pac_parser.POINTER_OFFSET, BLOB_START)
+    offs = []
+    blob = bytearray()
+    for raw in strings:
+        offs.append(BLOB_START + len(blob))
+        blob += raw + b"\x00"
+    for slot, i in slots.items():
+        struct.pack_into("<I", data, slot, offs[i])
+    path.write_bytes(bytes(data + blob))
+    return offs
+
+
+def write_csv(path: Path, rows: list[tuple[int, str]]) -> None:
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["index", "offset", "text"])
+        for i, (off, text) in enumerate(rows):
+            w.writerow([i, f"0x{off:08X}", text])
+
+
+def run_patch(d: Path, tables: str | None = None) -> str:
+    out = io.StringIO()
+    with redirect_stdout(out):
+        mhfpac_import.patch(
+            bin_in=d / "in.bin",
+            csv_in=d / "edits.csv",
+            bin_out=d / "out.bin",
+            encoding="cp932",
+            tables=mhfpac_import.parse_tables_arg(tables),
+            backup=False,
+            validate=True,
+        )
+    return out.getvalue()
+
+
+def u32(buf: bytes, off: int) -> int:
+    return struct.unpack_from("<I", buf, off)[0]
+
+
+class PatchTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_edit_repoints_every_slot_across_merged_tables(self):
+        # 0x0A1C is in both skills and skillActive; 0x0A40, 0x0FB0 and 0x00B8
+        # come from skillActive, zskills and skillDesc.
+        shared = [0x0A1C, 0x0A40, 0x0FB0, 0x00B8]
+        slots = {s: 0 for s in shared}
+        slots[0x0A44] = 1
+        strings = ["攻撃力".encode("cp932"), b"Guard"]
+        offs = make_pac(self.dir / "in.bin", strings, slots)
+        write_csv(self.dir / "edits.csv", [(offs[0], "Attack"), (offs[1], "Guard")])
+
+        report = run_patch(self.dir, "skills,skillActive,zskills,skillDesc")
+
+        orig = (self.dir / "in.bin").read_bytes()
+        out = (self.dir / "out.bin").read_bytes()
+        self.assertEqual(out[len(orig):], b"Attack\x00")
+        for slot in shared:
+            self.assertEqual(u32(out, slot), len(orig), f"slot 0x{slot:X}")
+        self.assertEqual(u32(out, 0x0A44), offs[1])
+        # Everything except the repointed slots is untouched
+        patched = bytearray(orig)
+        for slot in shared:
+            struct.pack_into("<I", patched, slot, len(orig))
+        self.assertEqual(out[:len(orig)], bytes(patched))
+        self.assertIn("Strings changed: 1", report)
+        self.assertIn("Pointer slots updated: 4", report)
+
+    def test_several_edits_append_in_csv_order(self):
+        slots = {0x0A20: 0, 0x0A24: 1, 0x0A28: 2}
+        offs = make_pac(self.dir / "in.bin", [b"a", b"b", b"c"], slots)
+        write_csv(self.dir / "edits.csv", [(offs[2], "CC"), (offs[1], "b"), (offs[0], "AAA")])
+
+        run_patch(self.dir)
+
+        base = (self.dir / "in.bin").stat().st_size
+        out = (self.dir / "out.bin").read_bytes()
+        self.assertEqual(out[base:], b"CC\x00AAA\x00")
+        self.assertEqual(u32(out, 0x0A28), base)
+        self.assertEqual(u32(out, 0x0A24), offs[1])
+        self.assertEqual(u32(out, 0x0A20), base + 3)
+
+    def test_unedited_export_is_byte_identical(self):
+        slots = {0x0A1C: 0, 0x0A20: 1, 0x0A24: 1, 0x0FB0: 2, 0x00BC: 3}
+        strings = [b"Log", "チャット".encode("cp932"), b"", b"\x81"]
+        make_pac(self.dir / "in.bin", strings, slots)
+        with redirect_stdout(io.StringIO()):
+            pac_parser.export_strings(self.dir / "in.bin", self.dir / "edits.csv")
+
+        report = run_patch(self.dir)
+
+        self.assertEqual((self.dir / "out.bin").read_bytes(), (self.dir / "in.bin").read_bytes())
+        self.assertIn("Strings changed: 0", report)
+
+    def test_latin1_fallback_row_is_unchanged(self):
+        # Older exporters wrote strings cp932 cannot decode as latin-1 text;
+        # importing such a CSV unedited must not repoint the string.
+        raw = b"\x85\x40abc"
+        offs = make_pac(self.dir / "in.bin", [raw], {0x00B8: 0})
+        write_csv(self.dir / "edits.csv", [(offs[0], raw.decode("latin-1"))])
+
+        run_patch(self.dir)
+
+        self.assertEqual((self.dir / "out.bin").read_bytes(), (self.dir / "in.bin").read_bytes())
+
+
+class MergeRangesTest(unittest.TestCase):
+    def test_overlapping_and_contained(self):
+        self.assertEqual(
+            mhfpac_import.merge_ranges([(0x0A1C, 0x0BC0), (0x0A1C, 0x0A20), (0x0B00, 0x0C00)]),
+            [(0x0A1C, 0x0C00)],
+        )
+
+    def test_adjacent(self):
+        self.assertEqual(mhfpac_import.merge_ranges([(8, 12), (0, 8)]), [(0, 12)])
+
+    def test_disjoint_sorted(self):
+        self.assertEqual(
+            mhfpac_import.merge_ranges([(0x0FB0, 0x0FBC), (0x00B8, 0x00C0)]),
+            [(0x00B8, 0x00C0), (0x0FB0, 0x0FBC)],
+        )
+
+    def test_empty(self):
+        self.assertEqual(mhfpac_import.merge_ranges([]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()